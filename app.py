@@ -1,25 +1,82 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine, text
+import logging
+import threading
+from collections import deque
+from sqlalchemy import create_engine, event, text, bindparam, Date, Time
+from sqlalchemy.pool import StaticPool
 from datetime import datetime
 
 # Streamlit page configuration must be set before any other Streamlit API calls
 # (including decorators like @st.cache_resource). Place it immediately after imports.
 st.set_page_config(page_title="SecureCheck: Police Post Digital Ledger 🚓", layout="wide")
 
+logger = logging.getLogger(__name__)
+
 # --- Configuration ---
 DATABASE_URL = "sqlite:///police_logs.db" 
 TABLE_NAME = 'traffic_stops'
+QUERY_CACHE_TTL = 300  # seconds a cached query result stays valid
+# Tables/views the dashboard reads; all are created by process_data.py
+REQUIRED_DB_OBJECTS = (
+    TABLE_NAME, 'agg_drug_vehicles', 'agg_age_group_rates', 'agg_violation_rates',
+    'v_top_drug_vehicles', 'v_age_group_arrest_rates', 'v_violation_rates', 'stops_fts',
+)
+LOG_BATCH_SIZE = 50  # buffered log entries that trigger an immediate write
+LOG_FLUSH_INTERVAL = 5.0  # seconds before a partial batch of log entries is written
+
+# Applied to every new SQLite connection: WAL lets dashboard reads run alongside
+# form inserts, NORMAL sync avoids an fsync per commit, and the cache/mmap sizes
+# keep the working set in memory.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # 64 MiB
+    "PRAGMA mmap_size=1073741824",  # 1 GiB: full scans read straight from the OS page cache
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Columns written for each new log entry (stop_id and age_group are filled in by SQLite)
+LOG_COLUMNS = (
+    'stop_date', 'stop_time', 'country_name', 'vehicle_number', 'driver_gender', 'driver_age',
+    'violation', 'violation_raw', 'search_conducted', 'drugs_related_stop', 'is_arrested',
+    'stop_outcome', 'stop_duration', 'driver_race', 'search_type',
+)
+# Built once; Date/Time bind types store values in the same text format as the bulk load
+INSERT_STOP_SQL = text(
+    f"INSERT INTO {TABLE_NAME} ({', '.join(LOG_COLUMNS)}) "
+    f"VALUES ({', '.join(':' + col for col in LOG_COLUMNS)})"
+).bindparams(bindparam('stop_date', type_=Date), bindparam('stop_time', type_=Time))
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Engine "connect" listener: applies SQLITE_PRAGMAS to each new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
 
 # Connect to the database
 @st.cache_resource
 def get_database_engine():
     """Initializes and returns the database engine (for PostgreSQL/MySQL/SQLite)[cite: 19]."""
     try:
-        engine = create_engine(DATABASE_URL)
-        # Verify connection
+        # Streamlit reruns the script per interaction: keep one shared read connection
+        # (opened and configured once) instead of reopening the file per query.
+        # isolation_level=None puts sqlite3 in autocommit, so no transaction is ever left
+        # open on the shared connection. Writes use get_write_engine() instead.
+        engine = create_engine(
+            DATABASE_URL,
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False, "isolation_level": None},
+        )
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+
+        # Verify connection and that the database was built by the current process_data.py
         with engine.connect() as conn:
-            conn.execute(text(f"SELECT COUNT(*) FROM {TABLE_NAME}"))
+            existing = set(conn.execute(text("SELECT name FROM sqlite_master")).scalars())
+        missing = [name for name in REQUIRED_DB_OBJECTS if name not in existing]
+        if missing:
+            raise RuntimeError(f"missing {', '.join(missing)}")
         return engine
     except Exception as e:
         st.error(f"Database connection error: {e}. Please ensure 'process_data.py' was run first.")
@@ -27,29 +84,114 @@ def get_database_engine():
 
 engine = get_database_engine()
 
+@st.cache_resource
+def get_write_engine():
+    """
+    Returns a separate engine for log inserts. Writes get their own pooled connections,
+    so readers on the shared connection never see an uncommitted batch and, under WAL,
+    keep reading while a batch is being written.
+    """
+    write_engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    event.listen(write_engine, "connect", apply_sqlite_pragmas)
+    return write_engine
+
+write_engine = get_write_engine()
+
+@st.cache_resource
+def get_log_buffer():
+    """Returns the in-memory buffer of log entries awaiting a batched write (shared across reruns)."""
+    return {"pending": deque(), "lock": threading.Lock(), "timer": None}
+
 # --- Functions for Database Interaction ---
 
-def fetch_data(query_text):
-    """Executes a SQL query and returns the results as a Pandas DataFrame[cite: 28]."""
+@st.cache_data(ttl=QUERY_CACHE_TTL, show_spinner=False)
+def query_dataframe(query_text, params=None, chunksize=None, dtype=None):
+    """
+    Executes a (parameterized) SQL query and returns the results as a Pandas DataFrame.
+    Errors are raised, not cached, so a failed query is retried on the next call.
+    """
+    with engine.connect() as connection:
+        result = pd.read_sql(
+            text(query_text), connection, params=params,
+            chunksize=chunksize, coerce_float=False, dtype=dtype,
+        )
+        if chunksize is not None:
+            result = pd.concat(result, ignore_index=True)
+        return result
+
+def fetch_data(query_text, params=None, chunksize=None, dtype=None):
+    """
+    Executes a (parameterized) SQL query and returns the results as a Pandas DataFrame[cite: 28].
+    Pass chunksize to fetch the rows from the cursor in pieces of that size; the pieces
+    are then combined into one (cached) DataFrame, so peak memory is not reduced.
+    Pass dtype to skip pandas' per-column type inference.
+    """
     try:
-        with engine.connect() as connection:
-            df = pd.read_sql(text(query_text), connection)
-            return df
+        return query_dataframe(query_text, params, chunksize, dtype)
     except Exception as e:
         st.error(f"Error executing query: {e}")
         return pd.DataFrame()
 
+def flush_log_buffer(buffer=None):
+    """
+    Writes all buffered log entries to the traffic_stops table in a single transaction,
+    so bursts of submissions share one commit. Returns the number of entries written.
+    If the write fails the entries stay queued, a retry is scheduled and the error is re-raised.
+    """
+    buffer = buffer or get_log_buffer()
+    with buffer["lock"]:
+        if buffer["timer"] is not None:
+            buffer["timer"].cancel()
+            buffer["timer"] = None
+        rows = list(buffer["pending"])
+        if not rows:
+            return 0
+        try:
+            with write_engine.begin() as connection:
+                connection.execute(INSERT_STOP_SQL, rows)
+        except Exception as e:
+            logger.warning("Error writing %d pending log(s): %s. Retrying in %.0fs.", len(rows), e, LOG_FLUSH_INTERVAL)
+            schedule_log_flush(buffer)
+            raise
+        buffer["pending"].clear()
+    # Drop cached results so the latest logs and analytics include the new stops
+    query_dataframe.clear()
+    return len(rows)
+
+def schedule_log_flush(buffer):
+    """Starts the LOG_FLUSH_INTERVAL timer for a partial batch unless one is already running (caller holds the lock)."""
+    if buffer["timer"] is None:
+        buffer["timer"] = threading.Timer(LOG_FLUSH_INTERVAL, flush_log_buffer_in_background, args=(buffer,))
+        buffer["timer"].daemon = True
+        buffer["timer"].start()
+
+def flush_log_buffer_in_background(buffer):
+    """Timer callback: a failed write keeps the entries queued and is retried after another interval."""
+    try:
+        flush_log_buffer(buffer)
+    except Exception:
+        pass  # already logged and rescheduled by flush_log_buffer
+
 def log_new_stop(log_data):
     """
-    Inserts a new police log entry into the traffic_stops table (Real-time logging)[cite: 9].
+    Queues a new police log entry for the traffic_stops table (Real-time logging)[cite: 9].
+    Entries are written once LOG_BATCH_SIZE are pending or LOG_FLUSH_INTERVAL seconds pass.
     """
+    buffer = get_log_buffer()
+    with buffer["lock"]:
+        buffer["pending"].append(log_data)
+        batch_full = len(buffer["pending"]) >= LOG_BATCH_SIZE
+        if not batch_full:
+            schedule_log_flush(buffer)
+    if not batch_full:
+        # Not on disk yet: pending entries are lost if the app stops before the write
+        st.success(f"✅ New stop queued; it will be written within {LOG_FLUSH_INTERVAL:.0f} seconds.")
+        return
     try:
-        log_df = pd.DataFrame([log_data])
-        # Use if_exists='append' for real-time logging
-        log_df.to_sql(TABLE_NAME, engine, if_exists='append', index=False)
+        flush_log_buffer(buffer)
         st.success("✅ New Stop Logged Successfully!")
     except Exception as e:
-        st.error(f"Error logging stop: {e}")
+        st.warning(f"⚠️ New stop queued, but writing it failed ({e}); retrying in {LOG_FLUSH_INTERVAL:.0f} seconds.")
 
 
 # --- Streamlit Application Layout ---
@@ -103,53 +245,44 @@ with st.form("new_log_form"):
         }
         log_new_stop(new_log)
 
+# Buffered entries are written automatically; this writes them immediately
+if st.button("Flush Pending Logs Now"):
+    try:
+        st.success(f"✅ {flush_log_buffer()} pending log(s) written.")
+    except Exception as e:
+        st.warning(f"⚠️ Error writing pending logs ({e}); they stay queued and will be retried in {LOG_FLUSH_INTERVAL:.0f} seconds.")
+st.caption(f"{len(get_log_buffer()['pending'])} log(s) waiting to be written.")
+
 st.markdown("---")
 
 # --- 2. Advanced Insights and Analytics Section ---
 st.header("2. Advanced Insights (Data-backed Decision Making) [cite: 39]")
 
 # Dictionary of complex and medium SQL queries from the document [cite: 53, 76]
+# They are stored as views over the pre-aggregated agg_* tables by process_data.py, so the
+# SQL sent per click is a short constant string that SQLite's statement cache reuses.
 ANALYTICS_QUERIES = {
-    "Top 10 Vehicles in Drug-Related Stops [cite: 56]": """
-        SELECT vehicle_number, COUNT(*) AS drug_stop_count
-        FROM traffic_stops
-        WHERE drugs_related_stop = TRUE AND vehicle_number IS NOT NULL
-        GROUP BY vehicle_number
-        ORDER BY drug_stop_count DESC
-        LIMIT 10;
-    """,
-    "Arrest Rate by Driver Age Group [cite: 59]": """
-        SELECT
-            CASE
-                WHEN driver_age BETWEEN 16 AND 25 THEN '16-25'
-                WHEN driver_age BETWEEN 26 AND 35 THEN '26-35'
-                WHEN driver_age BETWEEN 36 AND 45 THEN '36-45'
-                ELSE '46+'
-            END AS age_group,
-            CAST(SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS REAL) * 100 / COUNT(*) AS arrest_rate_percentage
-        FROM traffic_stops
-        GROUP BY age_group
-        ORDER BY arrest_rate_percentage DESC;
-    """,
-    "Violations with High Search/Arrest Rates [cite: 80]": """
-        SELECT 
-            violation,
-            CAST(SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS REAL) * 100 / COUNT(*) AS search_rate,
-            CAST(SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS REAL) * 100 / COUNT(*) AS arrest_rate,
-            (CAST(SUM(CASE WHEN search_conducted = TRUE THEN 1 ELSE 0 END) AS REAL) * 100 / COUNT(*) + 
-             CAST(SUM(CASE WHEN is_arrested = TRUE THEN 1 ELSE 0 END) AS REAL) * 100 / COUNT(*)) / 2 AS combined_rate
-        FROM traffic_stops
-        GROUP BY violation
-        ORDER BY combined_rate DESC;
-    """
+    "Top 10 Vehicles in Drug-Related Stops [cite: 56]": "SELECT * FROM v_top_drug_vehicles",
+    "Arrest Rate by Driver Age Group [cite: 59]": "SELECT * FROM v_age_group_arrest_rates",
+    "Violations with High Search/Arrest Rates [cite: 80]": "SELECT * FROM v_violation_rates",
 }
 
-# Dropdown to select a query
-query_selection = st.selectbox("Select an Analytics Query to Run:", list(ANALYTICS_QUERIES.keys()))
+def request_analytics_run():
+    """Button handler: remembers which query to show, so reruns don't depend on the click."""
+    st.session_state['run_query'] = st.session_state['analytics_query']
+
+# Fragment: changing the dropdown or clicking the button reruns only this section
+@st.fragment
+def analytics_section():
+    # Dropdown to select a query
+    st.selectbox("Select an Analytics Query to Run:", list(ANALYTICS_QUERIES.keys()), key='analytics_query')
+    st.button("Run Analytics Query", on_click=request_analytics_run)
 
-if st.button("Run Analytics Query"):
-    selected_query = ANALYTICS_QUERIES[query_selection]
-    results_df = fetch_data(selected_query)
+    # Only query once the button has been clicked; later reruns reuse the cached result
+    query_selection = st.session_state.get('run_query')
+    if not query_selection:
+        return
+    results_df = fetch_data(ANALYTICS_QUERIES[query_selection])
     
     if not results_df.empty:
         st.subheader(f"Results for: {query_selection}")
@@ -161,30 +294,60 @@ if st.button("Run Analytics Query"):
         elif 'combined_rate' in results_df.columns:
             st.bar_chart(results_df, x='violation', y='combined_rate')
 
+analytics_section()
+
 
 st.markdown("---")
 
 # --- 3. Latest Logs Display and Search Filter ---
 st.header("3. Real-time Logs and Quick Search [cite: 27, 28]")
 
-# Implement SQL-based search filters for quick lookups [cite: 28]
-search_term = st.text_input("Search Logs by Country Name or Vehicle Number:")
+# Fragment: typing a search term reruns only this section, not the whole dashboard
+@st.fragment
+def latest_logs_section():
+    # Implement SQL-based search filters for quick lookups [cite: 28]
+    search_term = st.text_input("Search Logs by Country Name or Vehicle Number:")
+
+    # Construct the query based on the search filter (the term is bound, never interpolated)
+    base_query = f"""
+        SELECT 
+            stop_id, stop_date, stop_time, country_name, vehicle_number, 
+            violation, stop_outcome, is_arrested, drugs_related_stop 
+        FROM {TABLE_NAME}
+    """
+    # The term is matched literally on every path: countries are compared in Python,
+    # LIKE wildcards are escaped and the FTS5 term is quoted.
+    conditions = []
+    query_params = {}
+    if search_term:
+        # There are only a few countries: match them here (the list is cached) and add the
+        # country condition only when one matches. Otherwise the OR would force a walk of
+        # the whole date/time index and defeat the vehicle-number index below.
+        countries = fetch_data(f"SELECT DISTINCT country_name FROM {TABLE_NAME}")
+        matched_countries = [
+            country for country in countries.get('country_name', [])
+            if country and search_term.lower() in country.lower()
+        ]
+        if matched_countries:
+            query_params = {f"country_{i}": country for i, country in enumerate(matched_countries)}
+            conditions.append(f"country_name IN ({', '.join(':' + name for name in query_params)})")
+    if len(search_term) >= 3:
+        # Vehicle numbers are looked up through the FTS5 trigram index
+        conditions.append("stop_id IN (SELECT rowid FROM stops_fts WHERE stops_fts MATCH :term)")
+        query_params["term"] = '"' + search_term.replace('"', '""') + '"'
+    elif search_term:
+        # Trigrams need at least 3 characters; shorter terms use LIKE
+        conditions.append("vehicle_number LIKE :pattern ESCAPE '\\'")
+        escaped_term = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query_params["pattern"] = f"%{escaped_term}%"
+    where_clause = f"WHERE {' OR '.join(conditions)}" if conditions else ""
 
-# Construct the query based on the search filter
-base_query = f"""
-    SELECT 
-        stop_id, stop_date, stop_time, country_name, vehicle_number, 
-        violation, stop_outcome, is_arrested, drugs_related_stop 
-    FROM {TABLE_NAME}
-"""
-where_clause = ""
-if search_term:
-    where_clause = f"WHERE country_name LIKE '%{search_term}%' OR vehicle_number LIKE '%{search_term}%'"
+    final_query = f"{base_query} {where_clause} ORDER BY stop_date DESC, stop_time DESC LIMIT 50"
 
-final_query = f"{base_query} {where_clause} ORDER BY stop_date DESC, stop_time DESC LIMIT 50"
+    latest_logs_df = fetch_data(final_query, query_params)
+    st.dataframe(latest_logs_df, use_container_width=True)
 
-latest_logs_df = fetch_data(final_query)
-st.dataframe(latest_logs_df, use_container_width=True)
+latest_logs_section()
 
 # Footer/Technical tags [cite: 46]
 st.sidebar.markdown("### Technical Tags")
@@ -19,18 +19,19 @@ def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
     # 2. Handle the NAN values [cite: 23]
     
     # Fill missing categorical columns with a sensible default:
-    # 'search_type' is often NaN if 'search_conducted' is False.
-    df_cleaned['search_type'].fillna('None Conducted', inplace=True)
-    # Fill vehicle_number if missing
-    df_cleaned['vehicle_number'].fillna('Unknown', inplace=True)
+    # 'search_type' is often NaN if 'search_conducted' is False; a missing vehicle_number becomes 'Unknown'.
+    df_cleaned = df_cleaned.assign(
+        search_type=df_cleaned['search_type'].fillna('None Conducted'),
+        vehicle_number=df_cleaned['vehicle_number'].fillna('Unknown'),
+    )
 
     # Ensure boolean columns are correctly represented
-    for col in ['search_conducted', 'is_arrested', 'drugs_related_stop']:
-        df_cleaned[col] = df_cleaned[col].astype(bool)
+    bool_cols = ['search_conducted', 'is_arrested', 'drugs_related_stop']
+    df_cleaned[bool_cols] = df_cleaned[bool_cols].astype(bool)
 
     # Convert date and time columns to appropriate types for database insertion
-    df_cleaned['stop_date'] = pd.to_datetime(df_cleaned['stop_date']).dt.date
-    df_cleaned['stop_time'] = pd.to_datetime(df_cleaned['stop_time'], format='%H:%M:%S').dt.time
+    df_cleaned['stop_date'] = pd.to_datetime(df_cleaned['stop_date'], format='%Y-%m-%d', cache=True).dt.date
+    df_cleaned['stop_time'] = pd.to_datetime(df_cleaned['stop_time'], format='%H:%M:%S', cache=True).dt.time
     
     print("Data preprocessing complete.")
     return df_cleaned
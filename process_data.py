@@ -1,14 +1,199 @@
 import pandas as pd
-from sqlalchemy import create_engine, text
+import sqlite3
+import subprocess
+import tempfile
+import shutil
 import os
 
 # --- Configuration ---
 DATABASE_FILE = "police_logs.db"
-DATABASE_URL = f"sqlite:///{DATABASE_FILE}" 
 TABLE_NAME = 'traffic_stops'
 DATASET_PATH = "traffic_stops.csv" 
+BATCH_SIZE = 10000  # rows per executemany call during the bulk load
+SQLITE_CLI = shutil.which("sqlite3")  # enables the CSV .import fast path when installed
+CSV_NULL = r"\N"  # marks NULLs in the import CSV, so empty strings stay empty strings
 
-def create_and_load_database(df: pd.DataFrame, engine):
+# Explicit read_csv schema: skips per-column type inference and stores
+# low-cardinality text as categoricals. 'driver_age_raw' is not loaded at all.
+DTYPES = {
+    'country_name': 'category',
+    'driver_gender': 'category',
+    'driver_race': 'category',
+    'violation_raw': 'category',
+    'violation': 'category',
+    'stop_duration': 'category',
+    'stop_outcome': 'category',
+    'search_type': 'string',
+    'vehicle_number': 'string',
+    'driver_age': 'Int16',
+    'search_conducted': 'boolean',
+    'is_arrested': 'boolean',
+    'drugs_related_stop': 'boolean',
+}
+
+# Column order used for the bulk INSERT (matches the CREATE TABLE schema below)
+COLUMNS = (
+    'stop_date', 'stop_time', 'country_name', 'driver_gender', 'driver_age',
+    'driver_race', 'violation_raw', 'violation', 'search_conducted', 'search_type',
+    'stop_outcome', 'is_arrested', 'stop_duration', 'drugs_related_stop', 'vehicle_number',
+)
+
+def import_with_sqlite_cli(rows: pd.DataFrame, database_file: str = DATABASE_FILE):
+    """
+    Cold-load fast path: writes the rows to a temporary CSV and lets the sqlite3
+    shell '.import' it, bypassing Python-level row iteration entirely.
+    The CSV lands in a staging table first so CSV_NULL fields become NULLs in the real schema.
+    Returns False (after cleaning up) if the shell is missing, too old for '.import --csv'
+    (needs 3.32+) or fails, so the caller can fall back to the executemany path.
+    """
+    # Store booleans as 0/1 (as the INSERT path does) rather than 'True'/'False' text
+    csv_rows = rows.astype({col: int for col in ['search_conducted', 'is_arrested', 'drugs_related_stop']})
+    select_list = ', '.join(f"NULLIF({col}, '{CSV_NULL}')" for col in COLUMNS)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, f"{TABLE_NAME}.csv")
+        csv_rows.to_csv(csv_path, index=False, na_rep=CSV_NULL)
+        script = f"""
+.bail on
+PRAGMA synchronous=OFF;
+DROP TABLE IF EXISTS _staging;
+.import --csv "{csv_path}" _staging
+BEGIN;
+INSERT INTO {TABLE_NAME} ({', '.join(COLUMNS)}) SELECT {select_list} FROM _staging;
+DROP TABLE _staging;
+COMMIT;
+"""
+        try:
+            subprocess.run([SQLITE_CLI, database_file], input=script, text=True, check=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"sqlite3 shell import failed ({e}); falling back to executemany.")
+            return False
+    return True
+
+
+def create_summary_tables(connection: sqlite3.Connection):
+    """
+    Materializes the dashboard analytics as small pre-aggregated tables (exposed through
+    v_* views), so the app reads a handful of rows instead of scanning traffic_stops.
+    Counts (not rates) are stored so the AFTER INSERT trigger can keep them current.
+    """
+    connection.executescript(f"""
+    CREATE TABLE IF NOT EXISTS agg_drug_vehicles (
+        vehicle_number VARCHAR(20) PRIMARY KEY,
+        drug_stop_count INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_agg_drug_vehicles_count ON agg_drug_vehicles(drug_stop_count DESC);
+
+    CREATE TABLE IF NOT EXISTS agg_age_group_rates (
+        age_group TEXT PRIMARY KEY,
+        stop_count INTEGER NOT NULL,
+        arrest_count INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS agg_violation_rates (
+        violation VARCHAR(100) PRIMARY KEY,
+        stop_count INTEGER NOT NULL,
+        search_count INTEGER NOT NULL,
+        arrest_count INTEGER NOT NULL
+    );
+
+    INSERT INTO agg_drug_vehicles (vehicle_number, drug_stop_count)
+    SELECT vehicle_number, COUNT(*)
+    FROM {TABLE_NAME}
+    WHERE drugs_related_stop = TRUE AND vehicle_number IS NOT NULL
+    GROUP BY vehicle_number;
+
+    INSERT INTO agg_age_group_rates (age_group, stop_count, arrest_count)
+    SELECT age_group, COUNT(*), SUM(is_arrested)
+    FROM {TABLE_NAME}
+    GROUP BY age_group;
+
+    INSERT INTO agg_violation_rates (violation, stop_count, search_count, arrest_count)
+    SELECT violation, COUNT(*), SUM(search_conducted), SUM(is_arrested)
+    FROM {TABLE_NAME}
+    GROUP BY violation;
+
+    -- The dashboard's analytics queries, stored once so the app only sends SELECT * FROM v_...
+    CREATE VIEW IF NOT EXISTS v_top_drug_vehicles AS
+    SELECT vehicle_number, drug_stop_count
+    FROM agg_drug_vehicles
+    ORDER BY drug_stop_count DESC
+    LIMIT 10;
+
+    CREATE VIEW IF NOT EXISTS v_age_group_arrest_rates AS
+    SELECT
+        age_group,
+        arrest_count * 100.0 / stop_count AS arrest_rate_percentage
+    FROM agg_age_group_rates
+    ORDER BY arrest_rate_percentage DESC;
+
+    CREATE VIEW IF NOT EXISTS v_violation_rates AS
+    SELECT
+        violation,
+        search_count * 100.0 / stop_count AS search_rate,
+        arrest_count * 100.0 / stop_count AS arrest_rate,
+        (search_count + arrest_count) * 50.0 / stop_count AS combined_rate
+    FROM agg_violation_rates
+    ORDER BY combined_rate DESC;
+
+    -- Incrementally upsert the summaries for every stop logged from the dashboard
+    CREATE TRIGGER IF NOT EXISTS trg_{TABLE_NAME}_summaries AFTER INSERT ON {TABLE_NAME}
+    BEGIN
+        INSERT INTO agg_drug_vehicles (vehicle_number, drug_stop_count)
+        SELECT NEW.vehicle_number, 1
+        WHERE NEW.drugs_related_stop = TRUE AND NEW.vehicle_number IS NOT NULL
+        ON CONFLICT(vehicle_number) DO UPDATE SET drug_stop_count = drug_stop_count + 1;
+
+        INSERT INTO agg_age_group_rates (age_group, stop_count, arrest_count)
+        VALUES (NEW.age_group, 1, NEW.is_arrested)
+        ON CONFLICT(age_group) DO UPDATE SET
+            stop_count = stop_count + 1,
+            arrest_count = arrest_count + excluded.arrest_count;
+
+        INSERT INTO agg_violation_rates (violation, stop_count, search_count, arrest_count)
+        VALUES (NEW.violation, 1, NEW.search_conducted, NEW.is_arrested)
+        ON CONFLICT(violation) DO UPDATE SET
+            stop_count = stop_count + 1,
+            search_count = search_count + excluded.search_count,
+            arrest_count = arrest_count + excluded.arrest_count;
+    END;
+    """)
+
+
+def create_search_index(connection: sqlite3.Connection):
+    """
+    Builds an FTS5 trigram index over vehicle_number so the dashboard's substring search
+    for plates is an index lookup instead of a LIKE '%term%' full scan. country_name is
+    left out: it has only a few values, which the dashboard matches against its cached
+    list of distinct countries. The index is external-content (no second copy of the
+    text) and kept in sync by triggers.
+    """
+    connection.executescript(f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS stops_fts USING fts5(
+        vehicle_number,
+        content='{TABLE_NAME}', content_rowid='stop_id', tokenize='trigram'
+    );
+    INSERT INTO stops_fts(stops_fts) VALUES ('rebuild');
+
+    CREATE TRIGGER IF NOT EXISTS trg_stops_fts_insert AFTER INSERT ON {TABLE_NAME}
+    BEGIN
+        INSERT INTO stops_fts(rowid, vehicle_number) VALUES (NEW.stop_id, NEW.vehicle_number);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stops_fts_delete AFTER DELETE ON {TABLE_NAME}
+    BEGIN
+        INSERT INTO stops_fts(stops_fts, rowid, vehicle_number) VALUES ('delete', OLD.stop_id, OLD.vehicle_number);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stops_fts_update AFTER UPDATE OF vehicle_number ON {TABLE_NAME}
+    BEGIN
+        INSERT INTO stops_fts(stops_fts, rowid, vehicle_number) VALUES ('delete', OLD.stop_id, OLD.vehicle_number);
+        INSERT INTO stops_fts(rowid, vehicle_number) VALUES (NEW.stop_id, NEW.vehicle_number);
+    END;
+    """)
+
+
+def create_and_load_database(df: pd.DataFrame, database_file: str = DATABASE_FILE):
     """
     Creates the SQL table schema and loads the processed data.
     Corresponds to Step 2: Database Design (SQL)[cite: 24].
@@ -18,7 +203,7 @@ def create_and_load_database(df: pd.DataFrame, engine):
     # NOTE: The schema is adapted from the document's dataset explanation [cite: 89-103].
     create_table_sql = f"""
     CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-        stop_id INTEGER PRIMARY KEY,
+        stop_id INTEGER PRIMARY KEY,  -- alias for ROWID, assigned by SQLite on insert
         stop_date DATE NOT NULL,
         stop_time TIME NOT NULL,
         country_name VARCHAR(50) NOT NULL,
@@ -33,21 +218,83 @@ def create_and_load_database(df: pd.DataFrame, engine):
         is_arrested BOOLEAN NOT NULL,
         stop_duration VARCHAR(20),
         drugs_related_stop BOOLEAN NOT NULL,
-        vehicle_number VARCHAR(20)
+        vehicle_number VARCHAR(20),
+        -- Derived once per row at insert time for the age-group summary and its trigger
+        age_group TEXT GENERATED ALWAYS AS (
+            CASE
+                WHEN driver_age BETWEEN 16 AND 25 THEN '16-25'
+                WHEN driver_age BETWEEN 26 AND 35 THEN '26-35'
+                WHEN driver_age BETWEEN 36 AND 45 THEN '36-45'
+                ELSE '46+'
+            END
+        ) STORED
     );
     """
     
-    with engine.connect() as connection:
+    # Convert dates/times to the text format SQLite stores and NaN to NULL,
+    # so sqlite3 can bind every value without going through pandas/SQLAlchemy.
+    rows = df[list(COLUMNS)].assign(
+        stop_date=df['stop_date'].astype(str),
+        stop_time=df['stop_time'].map(lambda t: t.strftime('%H:%M:%S.%f')),
+    ).astype(object)
+    rows = rows.where(rows.notna(), None)
+
+    insert_sql = (
+        f"INSERT INTO {TABLE_NAME} ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(COLUMNS))})"
+    )
+
+    connection = sqlite3.connect(database_file)
+    try:
+        # 8 KiB pages mean fewer page reads for full scans (summary build, LIKE searches);
+        # this must run before the first table is created (and before WAL) to take effect
+        connection.execute("PRAGMA page_size=8192")
+        # Bulk-load tuning: WAL journal, no fsync per statement, temp data in memory
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute("PRAGMA temp_store=MEMORY")
+
         # Execute the CREATE TABLE statement
-        connection.execute(text(create_table_sql))
-        connection.commit()
+        connection.execute(create_table_sql)
         print(f"Table '{TABLE_NAME}' created successfully.")
 
-        # 2. Insert data into the SQL table
-        # We use 'append' since we create the schema explicitly above
-        df.to_sql(TABLE_NAME, engine, if_exists='append', index=True, index_label='stop_id')
+        # 2. Insert data into the SQL table: CSV .import when the sqlite3 shell is available,
+        # otherwise BATCH_SIZE executemany slices, all in a single transaction
+        if not (SQLITE_CLI and import_with_sqlite_cli(rows, database_file)):
+            # The shell's transaction never committed; only a half-imported staging table can remain
+            connection.execute("DROP TABLE IF EXISTS _staging")
+            cur = connection.cursor()
+            cur.execute("BEGIN")
+            for start in range(0, len(rows), BATCH_SIZE):
+                batch = rows.iloc[start:start + BATCH_SIZE]
+                cur.executemany(insert_sql, batch.itertuples(index=False, name=None))
+                print(f"  Inserted {min(start + BATCH_SIZE, len(rows))}/{len(rows)} rows...")
+            connection.commit()
         print(f"Data successfully loaded into '{TABLE_NAME}'. Total rows: {len(df)}")
 
+        # 3. Create indexes after the load (cheaper than maintaining them row by row)
+        # Serves the dashboard's "latest logs" ORDER BY ... LIMIT 50 without a full sort
+        connection.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_stops_date_time ON {TABLE_NAME}(stop_date DESC, stop_time DESC)"
+        )
+        # No GROUP BY indexes: the analytics read the agg_* summaries below, so such
+        # indexes would only add write cost to every logged stop
+        connection.commit()
+        print("Indexes created successfully.")
+
+        # 4. Materialize the analytics summaries (kept current by an AFTER INSERT trigger)
+        create_summary_tables(connection)
+        print("Analytics summary tables created successfully.")
+
+        # 5. Full-text (trigram) index for the dashboard's quick search
+        create_search_index(connection)
+        print("Search index created successfully.")
+
+        # Collect statistics so the query planner picks the new indexes
+        connection.execute("ANALYZE")
+    finally:
+        connection.close()
+
 
 def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -65,16 +312,18 @@ def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
     df_cleaned = df_cleaned.drop(columns=['driver_age_raw'], errors='ignore')
 
     # Handle NaN values for categorical columns (e.g., search_type)
-    df_cleaned['search_type'].fillna('None Conducted', inplace=True)
-    df_cleaned['vehicle_number'].fillna('Unknown', inplace=True)
+    df_cleaned = df_cleaned.assign(
+        search_type=df_cleaned['search_type'].fillna('None Conducted'),
+        vehicle_number=df_cleaned['vehicle_number'].fillna('Unknown'),
+    )
 
-    # Convert boolean columns to ensure correct storage in SQLite
-    for col in ['search_conducted', 'is_arrested', 'drugs_related_stop']:
-        df_cleaned[col] = df_cleaned[col].astype(bool)
+    # Convert boolean columns to ensure correct storage in SQLite (one vectorized call)
+    bool_cols = ['search_conducted', 'is_arrested', 'drugs_related_stop']
+    df_cleaned[bool_cols] = df_cleaned[bool_cols].astype(bool)
 
-    # Convert date and time columns
-    df_cleaned['stop_date'] = pd.to_datetime(df_cleaned['stop_date']).dt.date
-    df_cleaned['stop_time'] = pd.to_datetime(df_cleaned['stop_time']).dt.time
+    # Convert date and time columns (explicit formats + cache hit the fast parser path)
+    df_cleaned['stop_date'] = pd.to_datetime(df_cleaned['stop_date'], format='%Y-%m-%d', cache=True).dt.date
+    df_cleaned['stop_time'] = pd.to_datetime(df_cleaned['stop_time'], format='%H:%M:%S', cache=True).dt.time
     
     print("Data preprocessing complete.")
     return df_cleaned
@@ -86,14 +335,21 @@ if __name__ == "__main__":
 
     # 1. Load and preprocess
     try:
-        data = pd.read_csv(DATASET_PATH)
+        data = pd.read_csv(
+            DATASET_PATH,
+            dtype=DTYPES,
+            parse_dates=['stop_date'],
+            usecols=DTYPES.keys() | {'stop_date', 'stop_time'},
+        )
+        # Downcast to the smallest integer type that fits (ages fit in Int8)
+        data['driver_age'] = pd.to_numeric(data['driver_age'], downcast='integer')
+        print(f"Raw data loaded: {data.shape}, {data.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory")
         processed_data = preprocess_data(data)
     except FileNotFoundError:
         print(f"Error: Dataset file '{DATASET_PATH}' not found. Cannot proceed.")
         exit()
 
     # 2. Initialize database and load data
-    engine = create_engine(DATABASE_URL)
-    create_and_load_database(processed_data, engine)
+    create_and_load_database(processed_data)
     
     print("\nDatabase initialization complete. Run 'streamlit run app.py' next.")
\ No newline at end of file